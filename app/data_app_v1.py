@@ -1,3 +1,6 @@
+import hashlib
+from collections import OrderedDict
+
 import streamlit as st
 import pandas as pd
 import requests
@@ -70,6 +73,64 @@ def generate_profile_report(df):
         report_html = f.read()
     html(report_html, height=1000, scrolling=True)
 
+# === Modélisation (tables de faits et dimensions) ===
+# Le CSV final (en bytes) de chaque table est mémoïsé dans st.session_state, donc
+# propre à l'utilisateur, par (clé du jeu de données, colonnes, nom de la colonne ID) :
+# à chaque interaction, seules les tables dont une entrée a changé sont recalculées.
+# Le cache est vidé dès que le jeu de données change et borné en taille totale.
+
+MODEL_CACHE_MAX_BYTES = 1024 ** 3  # 1 Go de CSV par session
+
+def file_fingerprint(file, delimiter):
+    """Calculer une clé exacte pour un fichier téléversé (contenu, nom et délimiteur)."""
+    digest = hashlib.sha256(file.getvalue())
+    digest.update(f"{file.name}|{delimiter}".encode("utf-8"))
+    return digest.hexdigest()
+
+def clear_model_cache():
+    """Vider le cache des tables de modélisation de la session."""
+    st.session_state.pop("model_cache", None)
+    st.session_state.pop("model_cache_data_key", None)
+
+def model_id_collision(columns, id_column):
+    """Vérifier que le nom de la colonne ID n'est pas déjà parmi les colonnes sélectionnées."""
+    if id_column in columns:
+        st.error(f"La colonne ID « {id_column} » existe déjà parmi les colonnes sélectionnées. Veuillez changer le nom de la table ou la sélection.")
+        return True
+    return False
+
+def model_table_preview(df, columns, id_column):
+    """Aperçu des premières lignes de la table, avec la colonne ID."""
+    preview = df.head()[list(columns)]
+    preview.insert(0, id_column, range(1, len(preview) + 1))  # Ajouter une colonne ID
+    return preview
+
+def model_table_csv(df, data_key, columns, id_column):
+    """Renvoyer le CSV (bytes) de la table, mis en cache par (data_key, colonnes, colonne ID).
+
+    Sans data_key (données issues d'une base ou d'une API, non conservées entre
+    deux exécutions), le CSV est construit sans être mis en cache.
+    """
+    if data_key is not None and st.session_state.get("model_cache_data_key") != data_key:
+        clear_model_cache()  # Le jeu de données a changé : les entrées précédentes sont obsolètes
+    cache = st.session_state.setdefault("model_cache", OrderedDict())
+    key = (columns, id_column)
+    if data_key is not None and key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    table = df[list(columns)]
+    table.insert(0, id_column, range(1, len(table) + 1))  # Ajouter une colonne ID
+    payload = table.to_csv(index=False).encode("utf-8")
+    if data_key is None or len(payload) > MODEL_CACHE_MAX_BYTES:
+        return payload
+
+    st.session_state["model_cache_data_key"] = data_key
+    cache[key] = payload
+    while sum(len(cached) for cached in cache.values()) > MODEL_CACHE_MAX_BYTES:
+        cache.popitem(last=False)  # Évincer la table la moins récemment utilisée
+    return payload
+
 # === Interface Utilisateur ===
 st.title("🛠️ DataStack - Plateforme de Data Engineering")
 
@@ -81,14 +142,32 @@ source_type = st.sidebar.radio(
 )
 
 data = None
+data_key = None  # Clé exacte du fichier téléversé, calculée une seule fois au chargement
 
 if source_type == "Fichier local":
     uploaded_file = st.sidebar.file_uploader("Téléversez votre fichier", type=["csv", "xlsx"])
     delimiter = st.sidebar.text_input("Délimiteur (par défaut : ',')", value=',')
     if uploaded_file is not None:
-        data = load_local_file(uploaded_file, delimiter)
+        # Réutiliser le fichier déjà chargé tant que le téléversement et le délimiteur ne changent pas
+        upload_id = (uploaded_file.file_id, delimiter)
+        loaded = st.session_state.get("loaded_file")
+        if loaded is not None and loaded[0] == upload_id:
+            _, data, data_key = loaded
+        else:
+            data = load_local_file(uploaded_file, delimiter)
+            if data is not None:
+                data_key = file_fingerprint(uploaded_file, delimiter)
+                st.session_state["loaded_file"] = (upload_id, data, data_key)
+    else:
+        st.session_state.pop("loaded_file", None)
+        clear_model_cache()
 
-elif source_type == "Base de données":
+if source_type != "Fichier local":
+    # Libérer le fichier et les tables mémoïsés de la session
+    st.session_state.pop("loaded_file", None)
+    clear_model_cache()
+
+if source_type == "Base de données":
     db_connection = st.sidebar.text_input("Chaîne de connexion (SQLAlchemy)", "")
     db_query = st.sidebar.text_area("Requête SQL", "SELECT * FROM your_table")
     if st.sidebar.button("Charger depuis la base de données"):
@@ -164,8 +243,10 @@ if data is not None:
         # Vérifier si les données ont été nettoyées
         if 'cleaned_data' in locals():
             transformation_data = cleaned_data  # Utiliser les données nettoyées
+            transformation_key = f"{data_key}:clean" if data_key is not None else None  # clean_data est déterministe
         else:
             transformation_data = data
+            transformation_key = data_key
             st.warning("⚠️ Les données brutes seront utilisées car aucune étape de nettoyage n'a été effectuée.")
         
         # Création de la table de faits
@@ -176,21 +257,19 @@ if data is not None:
         )
     
         # Vérifier si des colonnes pour la table de faits ont été sélectionnées
-        if fact_columns:
-            fact_table = transformation_data[fact_columns]
-            fact_table.insert(0, 'ID', range(1, len(fact_table) + 1))  # Ajouter une colonne ID
+        if not fact_columns:
+            st.warning("Veuillez sélectionner des colonnes pour la Table de Faits.")
+        elif not model_id_collision(fact_columns, 'ID'):
             st.write("#### Table de Faits")
-            st.dataframe(fact_table.head())
+            st.dataframe(model_table_preview(transformation_data, fact_columns, 'ID'))
             
             # Bouton pour télécharger la table de faits
             st.download_button(
                 label="Télécharger la Table de Faits",
-                data=fact_table.to_csv(index=False),
+                data=model_table_csv(transformation_data, transformation_key, tuple(fact_columns), 'ID'),
                 file_name="fact_table.csv",
                 mime="text/csv"
             )
-        else:
-            st.warning("Veuillez sélectionner des colonnes pour la Table de Faits.")
     
         # Interface pour définir plusieurs tables de dimensions
         st.write("#### Définir des Tables de Dimensions")
@@ -202,7 +281,7 @@ if data is not None:
             step=1
         )
     
-        dimension_tables = []  # Liste pour stocker les tables de dimensions
+        dimension_tables = []  # Liste pour stocker les définitions (nom, colonnes) des tables de dimensions
         dimension_names = []   # Liste pour stocker les noms des tables
 
         for i in range(num_dimensions):
@@ -219,24 +298,23 @@ if data is not None:
                 key=f"dim_columns_{i}"  # Clé unique pour chaque widget
             )
         
-            if dimension_columns:
+            dimension_id = f"{dimension_name}ID"
+            if not dimension_columns:
+                st.warning(f"Veuillez sélectionner des colonnes pour la Table de Dimensions {i + 1}.")
+            elif not model_id_collision(dimension_columns, dimension_id):
                 # Créer la table de dimensions
-                dimension_table = transformation_data[dimension_columns]
-                dimension_table.insert(0, f"{dimension_name}ID", range(1, len(dimension_table) + 1))  # Ajouter une colonne ID
-                dimension_tables.append(dimension_table)
+                dimension_tables.append((dimension_name, list(dimension_columns)))
                 
                 st.write(f"Table de Dimensions : **{dimension_name}**")
-                st.dataframe(dimension_table.head())
+                st.dataframe(model_table_preview(transformation_data, dimension_columns, dimension_id))
                 
                 # Bouton pour télécharger la table
                 st.download_button(
                     label=f"Télécharger la Table {dimension_name}",
-                    data=dimension_table.to_csv(index=False),
+                    data=model_table_csv(transformation_data, transformation_key, tuple(dimension_columns), dimension_id),
                     file_name=f"{dimension_name}.csv",
                     mime="text/csv"
                 )
-            else:
-                st.warning(f"Veuillez sélectionner des colonnes pour la Table de Dimensions {i + 1}.")
 
     
     if st.sidebar.button("Exécuter"):